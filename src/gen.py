@@ -1,21 +1,28 @@
 #!/usr/bin/python3
 
 import os
-import json
+import re
+import orjson
+import aiofiles
 import aiohttp
 import asyncio
-from typing import Dict
+import functools
+import heapq
+from typing import Callable, Dict
 
-from stats import Stats, Options
+from stats import GitHubAPI, Stats, Options
 
 DIRNAME = os.path.realpath(os.path.dirname(__file__))
 TEMPLATE_DIR = os.path.join(DIRNAME, "templates")
 OUTPUT_DIR = os.path.join(DIRNAME, "..", "dist")
+TEMPLATE_NAMES = ("languages", "overview", "community")
+PLACEHOLDER_RE = re.compile(r"{{\s*([\w.-]+)\s*}}")
 
 
 def replace_with_data(data: Dict[str, str], content: str) -> str:
     """
-    Replace placeholder strings in a template with associated data.
+    Replace placeholder strings in a template with associated data in a single pass.
+    Placeholders without associated data are left untouched.
 
     Args:
         data (dict[str, str]): A dictionary of placeholder strings and their associated data.
@@ -35,9 +42,41 @@ def replace_with_data(data: Dict[str, str], content: str) -> str:
         "Hello, my name is John and I work as an engineer."
     """
 
-    for key, value in data.items():
-        content = content.replace("{{ " + key + " }}", value)
-    return content
+    return PLACEHOLDER_RE.sub(lambda m: data.get(m.group(1), m.group(0)), content)
+
+
+def compile_template(content: str) -> Callable[[Dict[str, str]], str]:
+    """
+    Split a template into literal text and placeholders once, so it can be rendered repeatedly without searching it again.
+
+    Args:
+        content (str): The template content.
+
+    Returns:
+        Callable[[dict[str, str]], str]: A function that renders the template like `replace_with_data` would.
+    """
+
+    head = content
+    segments = []
+    position = 0
+    for match in PLACEHOLDER_RE.finditer(content):
+        if not segments:
+            head = content[: match.start()]
+        else:
+            segments[-1][2] = content[position : match.start()]
+        segments.append([match.group(1), match.group(0), ""])
+        position = match.end()
+    if segments:
+        segments[-1][2] = content[position:]
+
+    def render(data: Dict[str, str]) -> str:
+        parts = [head]
+        for key, placeholder, literal in segments:
+            parts.append(data.get(key, placeholder))
+            parts.append(literal)
+        return "".join(parts)
+
+    return render
 
 
 def load_json(file: str) -> Dict:
@@ -51,15 +90,21 @@ def load_json(file: str) -> Dict:
         dict: Parsed JSON data.
     """
 
-    with open(file, "r") as f:
-        data = json.load(f)
+    with open(file, "rb") as f:
+        data = orjson.loads(f.read())
     return data
 
 
+@functools.lru_cache(maxsize=1)
 def get_inserted_styles() -> Dict[str, Dict[str, str]]:
     """
     Convert template styles from JSON to CSS properties ready for substitution.
 
+    Every style with a selector is rendered into a single CSS block under the
+    "styles" key; individual properties remain available as "styles.<name>.<property>".
+
+    The result is cached, so callers must not mutate it.
+
     Returns:
         dict[str, dict[str, str]]: A dictionary with two keys, "light" and "dark", each containing a dictionary of theme-specific CSS properties.
     """
@@ -68,6 +113,8 @@ def get_inserted_styles() -> Dict[str, Dict[str, str]]:
 
     dark_styles = {}
     light_styles = {}
+    dark_blocks = []
+    light_blocks = []
     for key, value in raw_styles.items():
         _selector = value.get("selector")
         _properties = value.get("properties")
@@ -90,10 +137,12 @@ def get_inserted_styles() -> Dict[str, Dict[str, str]]:
             _both_properties = "".join([f"\t{prop}: {val};\n" for prop, val in _both])
             _light_properties = "".join([f"\t{prop}: {val};\n" for prop, val in _light])
             _dark_properties = "".join([f"\t{prop}: {val};\n" for prop, val in _dark])
-            light_styles[
-                key
-            ] = f"{_selector} {{\n{_both_properties}{_light_properties}}}"
-            dark_styles[key] = f"{_selector} {{\n{_both_properties}{_dark_properties}}}"
+            light_blocks.append(
+                f"{_selector} {{\n{_both_properties}{_light_properties}}}"
+            )
+            dark_blocks.append(
+                f"{_selector} {{\n{_both_properties}{_dark_properties}}}"
+            )
 
         for prop, val in _light:
             light_styles[f"{key}.{prop}"] = val
@@ -104,69 +153,141 @@ def get_inserted_styles() -> Dict[str, Dict[str, str]]:
             dark_styles[f"{key}.{prop}"] = val
 
     return {
-        "light": {f"styles.{key}": value for key, value in light_styles.items()},
-        "dark": {f"styles.{key}": value for key, value in dark_styles.items()},
+        "light": {
+            "styles": "\n\n".join(light_blocks),
+            **{f"styles.{key}": value for key, value in light_styles.items()},
+        },
+        "dark": {
+            "styles": "\n\n".join(dark_blocks),
+            **{f"styles.{key}": value for key, value in dark_styles.items()},
+        },
     }
 
 
-async def generate_image(template_name: str, s: Stats, output_path: str) -> None:
+def load_template(template_name: str) -> Dict[str, Callable[[Dict[str, str]], str]]:
     """
-    Generate an image based on the given template.
+    Load a template, apply the styles of each theme to it and compile the result.
+
+    Styles do not depend on any user data, so they are substituted once up front
+    and rendering an image only has to fill in the data placeholders.
+
+    Args:
+        template_name (str): Name of the template, without the .svg extension.
+
+    Returns:
+        dict[str, Callable]: A dictionary with two keys, "light" and "dark", each containing a compiled, styled template.
     """
 
     with open(os.path.join(TEMPLATE_DIR, f"{template_name}.svg"), "r") as f:
         template = f.read()
 
+    return {
+        theme: compile_template(replace_with_data(theme_styles, template))
+        for theme, theme_styles in get_inserted_styles().items()
+    }
+
+
+async def write_file(file: str, content: str) -> None:
+    """
+    Write content to a file without blocking the event loop.
+
+    Args:
+        file (str): Path to the file.
+        content (str): The content to write.
+    """
+
+    async with aiofiles.open(file, "w") as f:
+        await f.write(content)
+
+
+async def generate_image(
+    template_name: str,
+    templates: Dict[str, Callable[[Dict[str, str]], str]],
+    s: Stats,
+    output_path: str,
+) -> None:
+    """
+    Generate an image based on the given template.
+    """
+
+    (
+        name,
+        joined,
+        followers,
+        following,
+        sponsoring,
+        starred_repositories,
+        stargazers,
+        forks,
+        total_contributions,
+        lines_changed,
+        repositories,
+    ) = await asyncio.gather(
+        s.name,
+        s.joined,
+        s.followers,
+        s.following,
+        s.sponsoring,
+        s.starred_repositories,
+        s.stargazers,
+        s.forks,
+        s.total_contributions,
+        s.lines_changed,
+        s.repositories,
+    )
+
     replacements = {
-        "name": await s.name,
-        "joined_relative": (await s.joined).diff_for_humans(),
-        "joined_formatted": (await s.joined).to_formatted_date_string(),
-        "followers": f"{await s.followers:,}",
-        "following": f"{await s.following:,}",
-        "sponsoring": f"{await s.sponsoring:,}",
-        "starred_repositories": f"{await s.starred_repositories:,}",
-        "stargazers": f"{await s.stargazers:,}",
-        "forks": f"{await s.forks:,}",
-        "contributions": f"{await s.total_contributions:,}",
-        "lines_changed": f"{((await s.lines_changed)[0] + (await s.lines_changed)[1]):,}",
-        "repository_count": f"{len(await s.repositories):,}",
+        "name": name,
+        "joined_relative": joined.diff_for_humans(),
+        "joined_formatted": joined.to_formatted_date_string(),
+        "followers": f"{followers:,}",
+        "following": f"{following:,}",
+        "sponsoring": f"{sponsoring:,}",
+        "starred_repositories": f"{starred_repositories:,}",
+        "stargazers": f"{stargazers:,}",
+        "forks": f"{forks:,}",
+        "contributions": f"{total_contributions:,}",
+        "lines_changed": f"{(lines_changed[0] + lines_changed[1]):,}",
+        "repository_count": f"{len(repositories):,}",
     }
 
     if template_name == "languages":
-        sorted_languages = sorted(
-            (await s.languages).items(), reverse=True, key=lambda t: t[1].get("size")
-        )[:8]
-
-        progress = "".join(
-            f'<span style="background-color: {data.get("color", "#000000")}; width: {data.get("prop", 0):0.3f}%;"></span>'
-            for lang, data in sorted_languages
+        sorted_languages = heapq.nlargest(
+            8, (await s.languages).items(), key=lambda t: t[1].get("size")
         )
 
-        lang_list = "".join(
-            f"""<li>
-<svg xmlns="http://www.w3.org/2000/svg" class="octicon" style="fill:{data.get("color", "#000000")};" viewBox="0 0 16 16" width="16" height="16"><circle xmlns="http://www.w3.org/2000/svg" cx="8" cy="9" r="5" /></svg>
+        progress = []
+        lang_list = []
+        for lang, data in sorted_languages:
+            color = data.get("color", "#000000")
+            prop = data.get("prop", 0)
+            progress.append(
+                f'<span style="background-color: {color}; width: {prop:0.3f}%;"></span>'
+            )
+            lang_list.append(
+                f"""<li>
+<svg xmlns="http://www.w3.org/2000/svg" class="octicon" style="fill:{color};" viewBox="0 0 16 16" width="16" height="16"><circle xmlns="http://www.w3.org/2000/svg" cx="8" cy="9" r="5" /></svg>
 <span class="lang">{lang}</span>
-<span class="percent">{data.get("prop", 0):0.2f}%</span>
+<span class="percent">{prop:0.2f}%</span>
 </li>"""
-            for lang, data in sorted_languages
-        )
+            )
 
-        replacements.update({"progress": progress, "lang_list": lang_list})
-    output = replace_with_data(replacements, template)
+        replacements.update(
+            {"progress": "".join(progress), "lang_list": "".join(lang_list)}
+        )
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    for theme in ["light", "dark"]:
-        with open(
-            os.path.join(
-                OUTPUT_DIR,
-                replace_with_data(
-                    {"theme": theme, "template": template_name}, output_path
-                ),
-            ),
-            "w",
-        ) as f:
-            f.write(replace_with_data(get_inserted_styles()[theme], output))
+    writes = []
+    for theme, render in templates.items():
+        path_data = {"theme": theme, "template": template_name}
+        writes.append(
+            write_file(
+                os.path.join(OUTPUT_DIR, replace_with_data(path_data, output_path)),
+                render({**replacements, **path_data}),
+            )
+        )
+    await asyncio.gather(*writes)
 
 
 async def main() -> None:
@@ -225,20 +346,32 @@ async def main() -> None:
             "Environment variable GENERATED_IMAGE_PATH must be set and end with .svg"
         )
 
-    async with aiohttp.ClientSession() as session:
+    templates = {name: load_template(name) for name in TEMPLATE_NAMES}
+
+    connector = aiohttp.TCPConnector(
+        limit=GitHubAPI.max_concurrency,
+        limit_per_host=GitHubAPI.max_concurrency,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
+    )
+    async with aiohttp.ClientSession(connector=connector) as session:
         s = Stats(
             user,
             access_token,
             session,
             options,
+            etag_cache_path=os.path.join(OUTPUT_DIR, ".etag_cache.json"),
         )
 
         await asyncio.gather(
-            generate_image("languages", s, generated_image_path),
-            generate_image("overview", s, generated_image_path),
-            generate_image("community", s, generated_image_path),
+            *[
+                generate_image(name, themed, s, generated_image_path)
+                for name, themed in templates.items()
+            ]
         )
 
+        s.api.save_etag_cache()
+
 
 if __name__ == "__main__":
     asyncio.run(main())
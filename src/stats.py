@@ -2,9 +2,22 @@
 
 import aiohttp
 import asyncio
+import orjson
 import os
 import pendulum
-from typing import Dict, List, Optional, Set, Any, cast, Tuple
+from string import Template
+from typing import (
+    DefaultDict,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Any,
+    Callable,
+    ClassVar,
+    Tuple,
+)
+from collections import defaultdict
 from dataclasses import dataclass
 
 
@@ -16,11 +29,43 @@ class Options:
     exclude_private_repos: bool = False
 
 
+# Retries back off 1, 2, 4, 8, 8, 8 seconds, so a repository whose stats are
+# still being computed stalls for about 30 seconds at most.
+REST_MAX_ATTEMPTS = 7
+REST_MAX_BACKOFF = 8
+
+
 @dataclass
 class GitHubAPI:
     access_token: str
     session: aiohttp.ClientSession
-    semaphore = asyncio.Semaphore(10)
+    etag_cache_path: Optional[str] = None
+    max_concurrency: ClassVar[int] = 20
+    semaphore: ClassVar[asyncio.Semaphore] = asyncio.Semaphore(max_concurrency)
+
+    def __post_init__(self) -> None:
+        self._etag_cache: Dict[str, Dict[str, Any]] = {}
+        if self.etag_cache_path is not None and os.path.exists(self.etag_cache_path):
+            try:
+                with open(self.etag_cache_path, "rb") as f:
+                    self._etag_cache = {
+                        path: entry
+                        for path, entry in orjson.loads(f.read()).items()
+                        if "value" in entry
+                    }
+            except (OSError, ValueError) as e:
+                print(f"Could not read ETag cache, ignoring it: {e}")
+
+    def save_etag_cache(self) -> None:
+        """
+        Persist ETags and transformed REST responses so later runs can reuse them.
+        """
+
+        if self.etag_cache_path is None:
+            return
+        os.makedirs(os.path.dirname(self.etag_cache_path), exist_ok=True)
+        with open(self.etag_cache_path, "wb") as f:
+            f.write(orjson.dumps(self._etag_cache))
 
     @property
     def headers(self) -> dict[str, str]:
@@ -34,137 +79,169 @@ class GitHubAPI:
                     headers=self.headers,
                     json={"query": query},
                 ) as response:
-                    result = await response.json()
+                    result = await response.json(loads=orjson.loads)
                     return result if result else {}
         except aiohttp.ClientError as e:
             print(f"GQL query failed: {e}")
             return {}
 
-    async def query_rest(self, path: str) -> Dict:
-        for _ in range(60):
-            if path.startswith("/"):
-                path = path[1:]
+    async def query_rest(
+        self, path: str, transform: Optional[Callable[[Any], Any]] = None
+    ) -> Any:
+        """
+        Query a REST endpoint, retrying while GitHub is still computing the response.
+
+        If `transform` is given, the response is passed through it before being
+        returned, and only the transformed value is kept in the ETag cache.
+        Untransformed responses are never cached.
+        """
+
+        if path.startswith("/"):
+            path = path[1:]
+
+        cached = self._etag_cache.get(path)
+        headers = self.headers
+        if cached is not None:
+            headers["If-None-Match"] = cached["etag"]
+
+        for attempt in range(REST_MAX_ATTEMPTS):
+            if attempt > 0:
+                await asyncio.sleep(min(2 ** (attempt - 1), REST_MAX_BACKOFF))
             try:
                 async with self.semaphore:
                     response = await self.session.get(
                         f"https://api.github.com/{path}",
-                        headers=self.headers,
+                        headers=headers,
                     )
+                if response.status == 304 and cached is not None:
+                    return cached["value"]
                 if response.status == 202:
                     print(f"A path returned 202 ({path}). Retrying...")
-                    await asyncio.sleep(2)
                     continue
 
-                result = await response.json()
+                result = await response.json(loads=orjson.loads)
                 if result is not None:
+                    if transform is None:
+                        return result
+                    result = transform(result)
+                    etag = response.headers.get("ETag")
+                    if response.status == 200 and etag is not None:
+                        self._etag_cache[path] = {"etag": etag, "value": result}
                     return result
             except aiohttp.ClientError:
                 print("Request failed. Retrying...")
-                await asyncio.sleep(2)
                 continue
 
         print("There were too many 202s. Data for this repository will be incomplete.")
-        return dict()
+        return dict() if transform is None else transform(dict())
 
 
 class Queries:
-    @staticmethod
-    def overview(
-        options: Options,
-        contrib_cursor: Optional[str] = None,
-        owned_cursor: Optional[str] = None,
-    ) -> str:
-        """
-        Get overall stats for a user.
-        """
-
-        return f"""{{
-    viewer {{
+    _overview = Template(
+        """{
+    viewer {
         login,
         name,
         createdAt,
-        followers {{
+        followers {
             totalCount
-        }},
-        following {{
+        },
+        following {
             totalCount
-        }},
-        sponsoring {{
+        },
+        sponsoring {
             totalCount
-        }},
-        starredRepositories {{
+        },
+        starredRepositories {
             totalCount
-        }},
+        },
         repositories(
-            {"privacy: PUBLIC," if options.exclude_private_repos else ""}
+            $privacy
             first: 100,
-            orderBy: {{
+            orderBy: {
                 field: UPDATED_AT,
                 direction: DESC
-            }},
+            },
             isFork: false,
             ownerAffiliations: [OWNER, ORGANIZATION_MEMBER],
-            after: {"null" if owned_cursor is None else '"'+ owned_cursor +'"'}
-        ) {{
-            pageInfo {{
+            after: $owned_cursor
+        ) {
+            pageInfo {
                 hasNextPage
                 endCursor
-            }}
-            nodes {{
+            }
+            nodes {
                 nameWithOwner
-                stargazers {{
+                stargazers {
                     totalCount
-                }}
+                }
                 forkCount
-                languages(first: 10, orderBy: {{field: SIZE, direction: DESC}}) {{
-                    edges {{
+                languages(first: 10, orderBy: {field: SIZE, direction: DESC}) {
+                    edges {
                         size
-                        node {{
+                        node {
                             name
                             color
-                        }}
-                    }}
-                }}
-            }}
-        }}
+                        }
+                    }
+                }
+            }
+        }
         repositoriesContributedTo(
             first: 100,
             includeUserRepositories: false,
-            orderBy: {{
+            orderBy: {
                 field: UPDATED_AT,
                 direction: DESC
-            }},
+            },
             contributionTypes: [
                 COMMIT,
                 PULL_REQUEST,
                 REPOSITORY,
                 PULL_REQUEST_REVIEW
             ]
-            after: {"null" if contrib_cursor is None else '"'+ contrib_cursor +'"'}
-        ) {{
-            pageInfo {{
+            after: $contrib_cursor
+        ) {
+            pageInfo {
                 hasNextPage
                 endCursor
-            }}
-            nodes {{
+            }
+            nodes {
                 nameWithOwner
-                stargazers {{
+                stargazers {
                     totalCount
-                }}
+                }
                 forkCount
-                languages(first: 10, orderBy: {{field: SIZE, direction: DESC}}) {{
-                    edges {{
+                languages(first: 10, orderBy: {field: SIZE, direction: DESC}) {
+                    edges {
                         size
-                        node {{
+                        node {
                             name
                             color
-                        }}
-                    }}
-                }}
-            }}
-        }}
-    }}
-}}"""
+                        }
+                    }
+                }
+            }
+        }
+    }
+}"""
+    )
+
+    @staticmethod
+    def overview(
+        options: Options,
+        contrib_cursor: Optional[str] = None,
+        owned_cursor: Optional[str] = None,
+    ) -> str:
+        """
+        Get overall stats for a user.
+        """
+
+        return Queries._overview.substitute(
+            privacy="privacy: PUBLIC," if options.exclude_private_repos else "",
+            owned_cursor="null" if owned_cursor is None else f'"{owned_cursor}"',
+            contrib_cursor="null" if contrib_cursor is None else f'"{contrib_cursor}"',
+        )
 
     @staticmethod
     def contribution_years() -> str:
@@ -222,8 +299,13 @@ class Stats:
         access_token: str,
         session: aiohttp.ClientSession,
         options: Options,
+        etag_cache_path: Optional[str] = None,
     ):
-        self.api = GitHubAPI(access_token=access_token, session=session)
+        self.api = GitHubAPI(
+            access_token=access_token,
+            session=session,
+            etag_cache_path=etag_cache_path,
+        )
         self.options = options
         self.username = username
 
@@ -240,16 +322,47 @@ class Stats:
         self._repositories: Optional[Set[str]] = None
         self._lines_changed: Optional[Tuple[int, int]] = None
 
+        self._get_task: Optional[asyncio.Task] = None
+        # Set once the first page of `_fetch` has been parsed, i.e. once
+        # `_joined` is known, without waiting for the remaining pages.
+        self._joined_known = asyncio.Event()
+        self._contributions_task: Optional[asyncio.Task] = None
+        self._lines_changed_task: Optional[asyncio.Task] = None
+
     async def get(self) -> None:
         """
         Get statistics about GitHub usage.
+
+        The statistics are fetched once; concurrent and later calls share that fetch.
+        """
+
+        await self._start_fetch()
+
+    def _start_fetch(self) -> asyncio.Task:
+        """
+        Start the shared fetch if it is not running yet and return its task.
+        """
+
+        if self._get_task is None:
+            self._get_task = asyncio.create_task(self._fetch())
+            # Never leave `_joined_known` waiters hanging if the fetch fails.
+            self._get_task.add_done_callback(lambda _: self._joined_known.set())
+        return self._get_task
+
+    async def _fetch(self) -> None:
+        """
+        Fetch statistics about GitHub usage. Use `get` instead.
         """
 
         self._stargazers = 0
         self._forks = 0
-        self._languages = dict()
         self._repositories = set()
 
+        lang_size: DefaultDict[str, int] = defaultdict(int)
+        lang_count: DefaultDict[str, int] = defaultdict(int)
+        lang_color: Dict[str, Optional[str]] = {}
+        excluded_langs = frozenset(x.lower() for x in self.options.excluded_langs or [])
+
         next_owned = None
         next_contrib = None
         while True:
@@ -264,53 +377,26 @@ class Stats:
                 or {}
             )
 
-            self._name = raw_results.get("data", {}).get("viewer", {}).get("name", None)
+            viewer = (raw_results.get("data") or {}).get("viewer") or {}
+
+            self._name = viewer.get("name", None)
             if self._name is None:
-                self._name = (
-                    raw_results.get("data", {})
-                    .get("viewer", {})
-                    .get("login", "No Name")
-                )
+                self._name = viewer.get("login", "No Name")
 
-            created_at = (
-                raw_results.get("data", {}).get("viewer", {}).get("createdAt", None)
-            )
+            created_at = viewer.get("createdAt", None)
             if created_at is not None:
                 self._joined = pendulum.parse(created_at)
+            self._joined_known.set()
 
-            self._followers = (
-                raw_results.get("data", {})
-                .get("viewer", {})
-                .get("followers", {})
-                .get("totalCount", 0)
-            )
-            self._following = (
-                raw_results.get("data", {})
-                .get("viewer", {})
-                .get("following", {})
-                .get("totalCount", 0)
-            )
-            self._sponsoring = (
-                raw_results.get("data", {})
-                .get("viewer", {})
-                .get("sponsoring", {})
-                .get("totalCount", 0)
-            )
-            self._starred_repositories = (
-                raw_results.get("data", {})
-                .get("viewer", {})
-                .get("starredRepositories", {})
-                .get("totalCount", 0)
+            self._followers = viewer.get("followers", {}).get("totalCount", 0)
+            self._following = viewer.get("following", {}).get("totalCount", 0)
+            self._sponsoring = viewer.get("sponsoring", {}).get("totalCount", 0)
+            self._starred_repositories = viewer.get("starredRepositories", {}).get(
+                "totalCount", 0
             )
 
-            contrib_repositories = (
-                raw_results.get("data", {})
-                .get("viewer", {})
-                .get("repositoriesContributedTo", {})
-            )
-            owned_repositories = (
-                raw_results.get("data", {}).get("viewer", {}).get("repositories", {})
-            )
+            contrib_repositories = viewer.get("repositoriesContributedTo", {})
+            owned_repositories = viewer.get("repositories", {})
 
             repos = owned_repositories.get("nodes", [])
             if not self.options.exclude_forked_repos:
@@ -327,19 +413,13 @@ class Stats:
                 self._forks += repo.get("forkCount", 0)
 
                 for lang in repo.get("languages", {}).get("edges", []):
-                    name = lang.get("node", {}).get("name", "Other")
-                    languages = await self.languages
-                    if name.lower() in {x.lower() for x in self.options.excluded_langs}:
+                    name = lang.get("node", {}).get("name") or "Other"
+                    if excluded_langs and name.lower() in excluded_langs:
                         continue
-                    if name in languages:
-                        languages[name]["size"] += lang.get("size", 0)
-                        languages[name]["occurrences"] += 1
-                    else:
-                        languages[name] = {
-                            "size": lang.get("size", 0),
-                            "occurrences": 1,
-                            "color": lang.get("node", {}).get("color"),
-                        }
+                    lang_size[name] += lang.get("size", 0)
+                    lang_count[name] += 1
+                    if name not in lang_color:
+                        lang_color[name] = lang.get("node", {}).get("color")
 
             if owned_repositories.get("pageInfo", {}).get(
                 "hasNextPage", False
@@ -353,9 +433,16 @@ class Stats:
             else:
                 break
 
-        langs_total = sum([v.get("size", 0) for v in self._languages.values()])
-        for k, v in self._languages.items():
-            v["prop"] = 100 * (v.get("size", 0) / langs_total)
+        langs_total = sum(lang_size.values())
+        self._languages = {
+            name: {
+                "size": size,
+                "occurrences": lang_count[name],
+                "color": lang_color[name],
+                "prop": 100 * (size / langs_total),
+            }
+            for name, size in lang_size.items()
+        }
 
     @property
     async def name(self) -> str:
@@ -363,8 +450,6 @@ class Stats:
         str: user's name/username
         """
 
-        if self._name is not None:
-            return self._name
         await self.get()
         assert self._name is not None
         return self._name
@@ -375,8 +460,6 @@ class Stats:
         pendulum.datetime: when the user joined GitHub
         """
 
-        if self._joined is not None:
-            return self._joined
         await self.get()
         assert self._joined is not None
         return self._joined
@@ -387,8 +470,6 @@ class Stats:
         int: total number of followers
         """
 
-        if self._followers is not None:
-            return self._followers
         await self.get()
         assert self._followers is not None
         return self._followers
@@ -399,8 +480,6 @@ class Stats:
         int: total number of users followed by user
         """
 
-        if self._following is not None:
-            return self._following
         await self.get()
         assert self._following is not None
         return self._following
@@ -411,8 +490,6 @@ class Stats:
         int: total number of users and organizations sponsored by user
         """
 
-        if self._sponsoring is not None:
-            return self._sponsoring
         await self.get()
         assert self._sponsoring is not None
         return self._sponsoring
@@ -423,8 +500,6 @@ class Stats:
         int: total number of repositories starred by user
         """
 
-        if self._starred_repositories is not None:
-            return self._starred_repositories
         await self.get()
         assert self._starred_repositories is not None
         return self._starred_repositories
@@ -435,8 +510,6 @@ class Stats:
         int: total number of stargazers on user's repositories
         """
 
-        if self._stargazers is not None:
-            return self._stargazers
         await self.get()
         assert self._stargazers is not None
         return self._stargazers
@@ -447,8 +520,6 @@ class Stats:
         int: total number of forks on user's repositories
         """
 
-        if self._forks is not None:
-            return self._forks
         await self.get()
         assert self._forks is not None
         return self._forks
@@ -459,8 +530,6 @@ class Stats:
         Dict: summary of languages used by the user
         """
 
-        if self._languages is not None:
-            return self._languages
         await self.get()
         assert self._languages is not None
         return self._languages
@@ -471,9 +540,8 @@ class Stats:
         Dict: summary of languages used by the user, with proportional usage
         """
 
-        if self._languages is None:
-            await self.get()
-            assert self._languages is not None
+        await self.get()
+        assert self._languages is not None
 
         return {k: v.get("prop", 0) for (k, v) in self._languages.items()}
 
@@ -483,8 +551,6 @@ class Stats:
         Set[str]: list of names of user's repositories
         """
 
-        if self._repositories is not None:
-            return self._repositories
         await self.get()
         assert self._repositories is not None
         return self._repositories
@@ -497,15 +563,34 @@ class Stats:
 
         if self._total_contributions is not None:
             return self._total_contributions
+        if self._contributions_task is None:
+            self._contributions_task = asyncio.create_task(
+                self._get_total_contributions()
+            )
+        return await self._contributions_task
 
-        self._total_contributions = 0
-        years = (
-            (await self.api.query_graphql(Queries.contribution_years()))
-            .get("data", {})
-            .get("viewer", {})
-            .get("contributionsCollection", {})
-            .get("contributionYears", [])
-        )
+    async def _get_total_contributions(self) -> int:
+        """
+        Query the user's total contributions. Use `total_contributions` instead.
+        """
+
+        self._start_fetch()
+        await self._joined_known.wait()
+        if self._joined is not None:
+            years = [
+                str(year)
+                for year in range(self._joined.year, pendulum.now("UTC").year + 1)
+            ]
+        else:
+            years = (
+                (await self.api.query_graphql(Queries.contribution_years()))
+                .get("data", {})
+                .get("viewer", {})
+                .get("contributionsCollection", {})
+                .get("contributionYears", [])
+            )
+
+        total_contributions = 0
         by_year = (
             (await self.api.query_graphql(Queries.all_contributions(years)))
             .get("data", {})
@@ -513,10 +598,11 @@ class Stats:
             .values()
         )
         for year in by_year:
-            self._total_contributions += year.get("contributionCalendar", {}).get(
+            total_contributions += year.get("contributionCalendar", {}).get(
                 "totalContributions", 0
             )
-        return cast(int, self._total_contributions)
+        self._total_contributions = total_contributions
+        return self._total_contributions
 
     @property
     async def lines_changed(self) -> Tuple[int, int]:
@@ -526,26 +612,55 @@ class Stats:
 
         if self._lines_changed is not None:
             return self._lines_changed
+        if self._lines_changed_task is None:
+            self._lines_changed_task = asyncio.create_task(self._get_lines_changed())
+        return await self._lines_changed_task
+
+    async def _get_lines_changed(self) -> Tuple[int, int]:
+        """
+        Query the lines added and deleted by the user. Use `lines_changed` instead.
+        """
+
         additions = 0
         deletions = 0
-        for repo in await self.repositories:
-            r = await self.api.query_rest(f"/repos/{repo}/stats/contributors")
-            for author_obj in r:
-                if not isinstance(author_obj, dict) or not isinstance(
-                    author_obj.get("author", {}), dict
-                ):
-                    continue
-                author = author_obj.get("author", {}).get("login", "")
-                if author != self.username:
-                    continue
-
-                for week in author_obj.get("weeks", []):
-                    additions += week.get("a", 0)
-                    deletions += week.get("d", 0)
+        results = await asyncio.gather(
+            *[
+                self.api.query_rest(
+                    f"/repos/{repo}/stats/contributors", transform=self._count_lines
+                )
+                for repo in await self.repositories
+            ]
+        )
+        for repo_additions, repo_deletions in results:
+            additions += repo_additions
+            deletions += repo_deletions
 
         self._lines_changed = (additions, deletions)
         return self._lines_changed
 
+    def _count_lines(self, contributors: Any) -> List[int]:
+        """
+        Sum the lines added and deleted by the user in a `/stats/contributors` response.
+
+        Only these two numbers are cached, not other contributors' activity.
+        """
+
+        additions = 0
+        deletions = 0
+        for author_obj in contributors:
+            if not isinstance(author_obj, dict) or not isinstance(
+                author_obj.get("author", {}), dict
+            ):
+                continue
+            author = author_obj.get("author", {}).get("login", "")
+            if author != self.username:
+                continue
+
+            for week in author_obj.get("weeks", []):
+                additions += week.get("a", 0)
+                deletions += week.get("d", 0)
+        return [additions, deletions]
+
 
 async def main() -> None:
     access_token = os.getenv("ACCESS_TOKEN")